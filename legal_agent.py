@@ -1,31 +1,52 @@
 import asyncio
 import aiohttp
-import concurrent.futures
 from openai import OpenAI
 import streamlit as st
 import json
 from datetime import datetime
 import time
 from typing import Dict, List, Any, Optional
-import threading
-from queue import Queue
 import os
+import sys
 from dotenv import load_dotenv
 load_dotenv()
 
+# orjson parses the CourtListener/SerpAPI payloads faster than the stdlib; optional, same as in marketing_agent
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# uvloop is a faster drop-in event loop for the CourtListener/SerpAPI fan-out; optional and not
+# available on Windows. Entry points must not set another loop policy after this
+if sys.platform != "win32":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+# Shared by every LegalAgent so the client's connection pool stays warm across briefs. Bounded
+# timeout and SDK retries so a stalled request can't hold the run for the 10-minute default
+openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=60.0, max_retries=2)
+
 class LegalAgent:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai_client
+        # Long-form analysis uses the full model; short query/lookup prompts keep the mini default
+        self.analysis_model = os.getenv("AGENT_BRAIN_MODEL", "gpt-4o")
         self.govinfo_key = os.getenv("GOVINFO_API_KEY")
         self.serpapi_key = os.getenv("SERPAPI_KEY")
-        self.results_queue = Queue()
         self.session = None
         
     async def create_session(self):
         """Create async session for concurrent API calls"""
         if not self.session:
             timeout = aiohttp.ClientTimeout(total=30)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            # Pooled keep-alive connections shared by the CourtListener and SerpAPI requests
+            connector = aiohttp.TCPConnector(limit=20, limit_per_host=8, ttl_dns_cache=300, keepalive_timeout=30)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
         return self.session
     
     async def close_session(self):
@@ -53,8 +74,9 @@ class LegalAgent:
         case_sources = []
         
         try:
-            # Generate fewer, more targeted queries
-            federal_query = self.call_openai_agent_optimized(
+            # Generate fewer, more targeted queries (in a thread so regulatory research can run alongside)
+            federal_query = await asyncio.to_thread(
+                self.call_openai_agent_optimized,
                 f"Generate 2-3 precise legal search queries for: {brief}. "
                 f"Focus on most critical regulatory and liability issues. "
                 f"Return as comma-separated list."
@@ -62,8 +84,8 @@ class LegalAgent:
             
             session = await self.create_session()
             
-            # Limit to 2-3 queries instead of 5
-            queries = [q.strip() for q in federal_query.split(',')[:3]]
+            # Limit to 2-3 queries instead of 5; drop blanks and repeats the model sometimes emits
+            queries = list(dict.fromkeys(q.strip() for q in federal_query.split(',')[:3] if q.strip()))
             
             # Run queries concurrently
             tasks = []
@@ -85,9 +107,9 @@ class LegalAgent:
     async def fetch_case_data(self, session, url, query):
         """Fetch case data asynchronously"""
         try:
-            async with session.get(url) as response:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = json_loads(await response.read())
                     opinions = data.get("results", [])[:3]
                     return [{
                         "source": "Federal Courts",
@@ -106,8 +128,9 @@ class LegalAgent:
         regulatory_sources = []
         
         try:
-            # Simplified regulatory query
-            reg_query = self.call_openai_agent_optimized(
+            # Simplified regulatory query (in a thread so case research can run alongside)
+            reg_query = await asyncio.to_thread(
+                self.call_openai_agent_optimized,
                 f"What are the top 3 regulatory agencies for: {brief}? "
                 f"List agency names and primary regulation types only."
             )
@@ -125,9 +148,10 @@ class LegalAgent:
                 }
                 
                 try:
-                    async with session.get(serp_url, params=params) as response:
+                    # Tighter than the session's 30s budget so one slow search can't stall the gather
+                    async with session.get(serp_url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
                         if response.status == 200:
-                            results = await response.json()
+                            results = json_loads(await response.read())
                             for item in results.get("organic_results", [])[:3]:
                                 regulatory_sources.append({
                                     "source": "Regulatory Compliance",
@@ -144,26 +168,25 @@ class LegalAgent:
             
         return regulatory_sources
     
-    def generate_streaming_analysis(self, brief, research_data, progress_callback=None):
+    async def generate_streaming_analysis(self, brief, research_data, progress_callback=None):
         """Generate analysis with streaming updates"""
         
-        # Step 1: Generate risk matrix
-        if progress_callback:
-            progress_callback("Generating risk assessment matrix...", 0.3)
-            
-        risk_matrix = self.generate_risk_matrix_optimized(brief, research_data)
-        
-        # Step 2: Generate compliance roadmap
+        # Step 1: Risk matrix and compliance roadmap are independent, so run them side by side
         if progress_callback:
-            progress_callback("Creating compliance roadmap...", 0.6)
+            progress_callback("Generating risk matrix and compliance roadmap...", 0.3)
             
-        compliance_roadmap = self.generate_compliance_roadmap_optimized(brief, research_data)
+        risk_matrix, compliance_roadmap = await asyncio.gather(
+            asyncio.to_thread(self.generate_risk_matrix_optimized, brief, research_data),
+            asyncio.to_thread(self.generate_compliance_roadmap_optimized, brief, research_data)
+        )
         
-        # Step 3: Generate executive summary
+        # Step 2: Generate executive summary (needs both of the above)
         if progress_callback:
             progress_callback("Finalizing executive summary...", 0.9)
             
-        executive_summary = self.generate_executive_summary_optimized(brief, risk_matrix, compliance_roadmap)
+        executive_summary = await asyncio.to_thread(
+            self.generate_executive_summary_optimized, brief, risk_matrix, compliance_roadmap
+        )
         
         return {
             "risk_matrix": risk_matrix,
@@ -186,7 +209,7 @@ class LegalAgent:
         Keep response under 1500 words.
         """
         
-        return self.call_openai_agent_optimized(risk_prompt, temperature=0.1)
+        return self.call_openai_agent_optimized(risk_prompt, temperature=0.1, model=self.analysis_model)
     
     def generate_compliance_roadmap_optimized(self, brief, research_data):
         """Optimized compliance roadmap"""
@@ -201,10 +224,19 @@ class LegalAgent:
         Keep response under 1500 words.
         """
         
-        return self.call_openai_agent_optimized(roadmap_prompt, temperature=0.1)
+        return self.call_openai_agent_optimized(roadmap_prompt, temperature=0.1, model=self.analysis_model)
+    
+    def _summarize_for_prompt(self, text, max_chars=2000):
+        """Bound a prior section for re-use as prompt input, keeping its opening and closing"""
+        if len(text) <= max_chars:
+            return text
+        half = max_chars // 2
+        return f"{text[:half]}\n...\n{text[-half:]}"
     
     def generate_executive_summary_optimized(self, brief, risk_matrix, compliance_roadmap):
         """Optimized executive summary"""
+        # The model only writes the summary from bounded excerpts; the full sections are appended
+        # locally instead of being re-sent as input and echoed back as output
         summary_prompt = f"""
         Create executive summary for: "{brief}"
         
@@ -213,17 +245,23 @@ class LegalAgent:
         ### Critical Risks
         ### Strategic Recommendations
         
-        ## DETAILED ANALYSIS
-        ### Risk Assessment
-        {risk_matrix}
+        Base it on these excerpts:
+        
+        Risk Assessment:
+        {self._summarize_for_prompt(risk_matrix)}
         
-        ### Compliance Roadmap
-        {compliance_roadmap}
+        Compliance Roadmap:
+        {self._summarize_for_prompt(compliance_roadmap)}
         
-        Keep total response under 2000 words.
+        Keep response under 600 words.
         """
         
-        return self.call_openai_agent_optimized(summary_prompt, temperature=0.1)
+        executive_summary = self.call_openai_agent_optimized(summary_prompt, temperature=0.1, model=self.analysis_model)
+        return (
+            f"{executive_summary}\n\n## DETAILED ANALYSIS\n\n"
+            f"### Risk Assessment\n{risk_matrix}\n\n"
+            f"### Compliance Roadmap\n{compliance_roadmap}"
+        )
     
     async def legal_agent_optimized(self, brief, progress_callback=None):
         """Optimized main legal analysis function"""
@@ -254,21 +292,22 @@ class LegalAgent:
             progress_callback("Analyzing research data...", 0.25)
         
         # Generate analysis with streaming updates
-        analysis_results = self.generate_streaming_analysis(brief, research_data, progress_callback)
+        analysis_results = await self.generate_streaming_analysis(brief, research_data, progress_callback)
         
         # Compile final results
         final_analysis = analysis_results["executive_summary"]
         
-        # Add simplified citations
-        citations = "\n\n## KEY SOURCES\n\n"
+        # Add simplified citations, collected as parts and joined once
+        citation_parts = ["\n\n## KEY SOURCES\n\n"]
         for source_type, sources in research_data.items():
             if source_type != "analysis_date" and sources:
-                citations += f"### {source_type.title()}:\n"
+                citation_parts.append(f"### {source_type.title()}:\n")
                 for source in sources[:3]:  # Limit to top 3
                     if isinstance(source, dict) and "error" not in source:
-                        citations += f"- {source.get('title', source.get('case', 'Source'))}\n"
+                        citation_parts.append(f"- {source.get('title', source.get('case', 'Source'))}\n")
                         if source.get('url'):
-                            citations += f"  📎 {source['url']}\n"
+                            citation_parts.append(f"  📎 {source['url']}\n")
+        citations = "".join(citation_parts)
         
         # Close session
         await self.close_session()
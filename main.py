@@ -251,7 +251,8 @@ class StreamingAnalysisUI:
         current_content = []
         
         for line in lines:
-            if line.startswith('##') or line.startswith('###'):
+            # '##' also covers '###' headers
+            if line.startswith('##'):
                 # Save previous section
                 if current_content:
                     sections[current_section] = '\n'.join(current_content)
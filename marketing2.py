@@ -1,4 +1,6 @@
 import os
+import re
+import threading
 import json
 import logging
 from typing import List, Dict, Any, Optional
@@ -11,6 +13,7 @@ from dataclasses import dataclass
 import hashlib
 import pickle
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from dotenv import load_dotenv
 load_dotenv()
@@ -37,6 +40,10 @@ class MarketingAgent:
     expert consultation on business ideas.
     """
     
+    # JSON extraction helpers, built once rather than on every chunk response
+    FENCED_JSON_RE = re.compile(r'```(?:json)?\s*({.*?})\s*```', re.DOTALL)
+    JSON_DECODER = json.JSONDecoder()
+    
     def __init__(self, 
                  openai_api_key: str = os.getenv("OPENAI_API_KEY"),
                  books_folder: str = "Legal_Marketing_Agents/books",
@@ -184,23 +191,22 @@ class MarketingAgent:
             pass
         
         # Look for JSON wrapped in code blocks or other text
-        import re
-        
         # Try to find JSON between triple backticks
-        json_match = re.search(r'```(?:json)?\s*({.*?})\s*```', response_text, re.DOTALL)
+        json_match = self.FENCED_JSON_RE.search(response_text)
         if json_match:
             try:
                 return json.loads(json_match.group(1))
             except json.JSONDecodeError:
                 pass
         
-        # Try to find JSON-like structure in the text
-        json_match = re.search(r'({.*?})', response_text, re.DOTALL)
-        if json_match:
+        # Try to decode an object starting at each brace; unlike a lazy regex this
+        # handles nested objects and braces inside strings
+        start = response_text.find('{')
+        while start != -1:
             try:
-                return json.loads(json_match.group(1))
+                return self.JSON_DECODER.raw_decode(response_text, start)[0]
             except json.JSONDecodeError:
-                pass
+                start = response_text.find('{', start + 1)
         
         # If all else fails, return a default structure
         logger.warning(f"Could not parse JSON from response: {response_text[:200]}...")
@@ -212,6 +218,59 @@ class MarketingAgent:
             "insights": []
         }
     
+    def _analyze_chunk(self, chunk: str, i: int, total_chunks: int, filename: str) -> Dict[str, Any]:
+        """Extract marketing knowledge from one section of a book"""
+        prompt = f"""
+        You are a marketing expert analyzing a section of the book "{filename}".
+        
+        Please analyze this content and extract:
+        1. Key marketing concepts and principles
+        2. Frameworks, models, or methodologies mentioned
+        3. Actionable strategies or tactics
+        4. Case studies or examples (brief summaries)
+        5. Important insights or takeaways
+        
+        Book content section {i+1}/{total_chunks}:
+        {chunk}
+        
+        IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
+        {{
+            "key_concepts": ["concept1", "concept2"],
+            "frameworks": ["framework1", "framework2"],
+            "strategies": ["strategy1", "strategy2"],
+            "case_studies": ["case1", "case2"],
+            "insights": ["insight1", "insight2"]
+        }}
+
+        Do not include any explanatory text before or after the JSON.
+        """
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a marketing expert. Always respond with a valid JSON object."},
+                    {"role": "user", "content": prompt}],
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+
+            response_text = response.choices[0].message.content.strip()
+            
+            # JSON mode returns a bare object, so the first json.loads attempt succeeds;
+            # the text-scanning fallbacks only matter for models without JSON mode
+            return self._extract_json_from_response(response_text)
+            
+        except Exception as e:
+            logger.error(f"Error processing chunk {i+1} of {filename}: {e}")
+            return {
+                "key_concepts": [],
+                "frameworks": [],
+                "strategies": [],
+                "case_studies": [],
+                "insights": []
+            }
+    
     def _process_book_with_ai(self, content: str, filename: str) -> Dict[str, Any]:
         """Process book content using OpenAI to extract key information"""
         
@@ -219,60 +278,13 @@ class MarketingAgent:
         max_chunk_size = 100000 
         chunks = [content[i:i+max_chunk_size] for i in tqdm(range(0, len(content), max_chunk_size))]
         
-        processed_chunks = []
-        
-        for i, chunk in enumerate(chunks):
-            prompt = f"""
-            You are a marketing expert analyzing a section of the book "{filename}".
-            
-            Please analyze this content and extract:
-            1. Key marketing concepts and principles
-            2. Frameworks, models, or methodologies mentioned
-            3. Actionable strategies or tactics
-            4. Case studies or examples (brief summaries)
-            5. Important insights or takeaways
-            
-            Book content section {i+1}/{len(chunks)}:
-            {chunk}
-            
-            IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
-            {{
-                "key_concepts": ["concept1", "concept2"],
-                "frameworks": ["framework1", "framework2"],
-                "strategies": ["strategy1", "strategy2"],
-                "case_studies": ["case1", "case2"],
-                "insights": ["insight1", "insight2"]
-            }}
-
-            Do not include any explanatory text before or after the JSON.
-            """
-            
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are a marketing expert. Always respond with a valid JSON object."},
-                        {"role": "user", "content": prompt}],
-                    temperature=0.3
-                )
-
-                response_text = response.choices[0].message.content.strip()
-                
-                # Parse JSON response
-                chunk_analysis = self._extract_json_from_response(response_text)
-                # chunk_analysis = json.loads(response.choices[0].message.content)
-                processed_chunks.append(chunk_analysis)
-                
-            except Exception as e:
-                logger.error(f"Error processing chunk {i+1} of {filename}: {e}")
-                processed_chunks.append({
-                    "key_concepts": [],
-                    "frameworks": [],
-                    "strategies": [],
-                    "case_studies": [],
-                    "insights": []
-                })
-                continue
+        # Chunks are independent, so their OpenAI calls run concurrently; results stay in chunk order
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(self._analyze_chunk, chunk, i, len(chunks), filename)
+                for i, chunk in enumerate(chunks)
+            ]
+            processed_chunks = [future.result() for future in futures]
         
         # Combine all chunks
         combined_analysis = {
@@ -395,7 +407,7 @@ class MarketingAgent:
         
         if not self.knowledge_base:
             return "No marketing books have been processed yet. Please add PDF books to the books folder."
-        print(agent.knowledge_base)
+        logger.debug("Consulting with %d books in the knowledge base", len(self.knowledge_base))
         
         # Compile knowledge base summary
         knowledge_summary = self._compile_knowledge_summary()
@@ -536,6 +548,23 @@ class MarketingAgent:
             "total_frameworks": len(set(framework for book in self.knowledge_base for framework in book.frameworks))
         }
 
+# Shared agent, built on first use; Streamlit sessions run on separate threads, so the
+# lock keeps two first calls from each loading the knowledge base
+_agent = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    """Get the shared MarketingAgent, loading the knowledge base and processing new books only once"""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = MarketingAgent(
+                    openai_api_key=str(os.getenv("OPENAI_API_KEY")),
+                    books_folder="Legal_Marketing_Agents/books"
+                )
+    return _agent
+
 # Example usage
 if __name__ == "__main__":
     # Initialize the agent
@@ -571,16 +600,10 @@ if __name__ == "__main__":
     print("="*80)
     print(consultation)
 
-def get_agent():
-    """Get an instance of the MarketingAgent"""
-    return MarketingAgent(
-        openai_api_key=str(os.getenv("OPENAI_API_KEY")),
-        books_folder="Legal_Marketing_Agents/books"
-    )
 def set_knowledge_base(agent):
     with open("E:/Moccet/marketing_knowledge_cache.pkl", 'r') as f:
         knowledge = pickle.load(f)
-        print(knowledge)
+        logger.debug("Loaded %d books into the knowledge base", len(knowledge))
         agent.knowledge_base = knowledge
     agent.knowledge_base = knowledge
     return agent
\ No newline at end of file
@@ -1,66 +1,360 @@
 import asyncio
 import aiohttp
-import concurrent.futures
-from openai import OpenAI
-import requests
+from openai import AsyncOpenAI
 import os
+import sys
 from dotenv import load_dotenv
 import json
 from datetime import datetime
 import time
 import re
-from typing import Dict, List, Tuple, Optional
-from queue import Queue
+import hashlib
+import pickle
 import threading
+import tempfile
+import atexit
+import random
+import heapq
+from itertools import islice
 
 load_dotenv()
 
+# orjson parses the SerpAPI/SEC payloads (including the multi-MB ticker file) several times
+# faster than the stdlib; optional, and its decode errors subclass json.JSONDecodeError
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# uvloop is a faster drop-in event loop for the SerpAPI/SEC/OpenAI fan-out; optional and not available on Windows
+if sys.platform != "win32":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+class ResponseCache:
+    """Response cache with SHA-256 keys, TTL expiry, hit/miss stats and optional pickle persistence.
+    Thread-safe; set() only marks the cache dirty and flush() writes it out"""
+    
+    def __init__(self, ttl_hours=24, cache_file=None):
+        self.ttl_seconds = ttl_hours * 3600
+        self.cache_file = cache_file
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        # Shared by Streamlit's worker threads: one lock for the entries, one to serialize file writes
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self._load()
+        if self.cache_file:
+            atexit.register(self.flush)
+    
+    def _live_entries(self, entries):
+        """Entries that have not yet expired"""
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if now - entry[0] < self.ttl_seconds}
+    
+    def _load(self):
+        """Load persisted entries from the cache file if available, dropping expired ones"""
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'rb') as f:
+                    self.entries = self._live_entries(pickle.load(f))
+            except Exception:
+                self.entries = {}
+    
+    def flush(self):
+        """Persist unexpired entries to the cache file if anything changed since the last flush"""
+        if not self.cache_file:
+            return
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                # Pruned copy, so the dump never sees the dict change under it
+                self.entries = self._live_entries(self.entries)
+                snapshot = dict(self.entries)
+                self.dirty = False
+            temp_file = None
+            try:
+                # Unique temp file in the same directory, then an atomic rename, so readers and
+                # concurrent writers never see a partial pickle
+                fd, temp_file = tempfile.mkstemp(
+                    dir=os.path.dirname(os.path.abspath(self.cache_file)),
+                    prefix=os.path.basename(self.cache_file) + ".", suffix=".tmp"
+                )
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(snapshot, f)
+                os.replace(temp_file, self.cache_file)
+            except Exception:
+                if temp_file and os.path.exists(temp_file):
+                    os.remove(temp_file)
+                with self.lock:
+                    self.dirty = True
+    
+    @staticmethod
+    def make_key(*parts):
+        """Build a stable cache key from the given parts"""
+        return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+    
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.time() - stored_at < self.ttl_seconds:
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.dirty = True
+            self.misses += 1
+            return None
+    
+    def set(self, key, value):
+        """Store a value under the given key; written to disk on the next flush"""
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.dirty = True
+    
+    def stats(self):
+        """Get cache hit/miss statistics"""
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+# Shared across agent instances and persisted (flushed at the end of each run) so repeated briefs
+# skip duplicate network calls
+serp_cache = ResponseCache(ttl_hours=24, cache_file="serp_response_cache.pkl")
+sec_cache = ResponseCache(ttl_hours=6, cache_file="sec_response_cache.pkl")
+# company_tickers.json changes rarely, so the parsed ticker -> CIK map is kept for a day
+ticker_cache = ResponseCache(ttl_hours=24, cache_file="sec_ticker_cache.pkl")
+# Persisted to disk (flushed at the end of each run) so re-running the same brief replays completions;
+# use a short TTL (e.g. 1h) in development
+llm_cache = ResponseCache(
+    ttl_hours=float(os.getenv("LLM_CACHE_TTL_HOURS", "24")),
+    cache_file="llm_response_cache.pkl"
+)
+
 class MarketingAgent:
+    # Stable system prefix for the analysis prompts; keeping it first and byte-identical
+    # across calls lets OpenAI's automatic prompt caching reuse it
+    RESEARCH_CONTEXT_PREFIX = (
+        "You are a senior market research analyst. Ground your analysis in the research data "
+        "you are given (market research, competitive intelligence, SEC filings and industry "
+        "classification) and cite concrete figures from it where available."
+    )
+    
+    # Relevance scoring: matched term -> (signal, weight). Years share one signal so recent
+    # content earns a single bonus however many years it mentions
+    RELEVANCE_TERMS = {
+        "billion": ("billion", 2),
+        "million": ("million", 2),
+        "market size": ("market size", 2),
+        "growth rate": ("growth rate", 2),
+        "tam": ("tam", 2),
+        "cagr": ("cagr", 2),
+        "2023": ("recent", 1),
+        "2024": ("recent", 1),
+        "2025": ("recent", 1)
+    }
+    # All terms in one alternation so each snippet is scanned once; matched against lowercased
+    # text, and acronyms need word boundaries so e.g. "tam" doesn't match inside "stamp"
+    RELEVANCE_TERMS_RE = re.compile(r"billion|million|market size|growth rate|\btam\b|\bcagr\b|2023|2024|2025")
+    
+    # Prompt-invariant instructions, built once and sent ahead of the per-brief content so
+    # every call starts with the same bytes and OpenAI's prefix cache can reuse them
+    INDUSTRY_INSTRUCTIONS = (
+        "Identify the primary industry for the business brief you are given.\n\n"
+        "primary_industry: industry name in snake_case (e.g. \"financial_services\")\n"
+        "industry_keywords: the top 3 search keywords\n"
+        "market_focus: e.g. \"market size\", \"growth\", \"competitive landscape\"\n\n"
+        "Keep response concise and focused on top 3 keywords only."
+    )
+    COMPANIES_INSTRUCTIONS = (
+        "Identify the top 3 public companies most relevant to the business brief and industry "
+        "you are given.\n\n"
+        "Return each company's name and its US stock ticker.\n\n"
+        "Focus on largest, most established companies only."
+    )
+    ANALYSIS_SECTIONS_INSTRUCTIONS = """Create a focused market analysis, competitive analysis and executive summary for the brief you are given.
+Return a JSON object whose values are markdown strings:
+{
+    "market_analysis": "...",
+    "competitive_analysis": "...",
+    "executive_summary": "..."
+}
+
+market_analysis must cover:
+
+## MARKET OPPORTUNITY
+- Market Size (TAM/SAM/SOM estimates)
+- Growth Rate & Trends
+- Key Market Drivers
+
+## TARGET MARKET
+- Primary Customer Segments
+- Market Entry Strategy
+- Revenue Potential
+
+competitive_analysis must cover:
+
+## COMPETITIVE LANDSCAPE
+- Top 3 Direct Competitors
+- Competitive Advantages/Disadvantages
+- Market Positioning
+
+## STRATEGIC RECOMMENDATIONS
+- Differentiation Strategy
+- Competitive Response
+- Market Entry Tactics
+
+executive_summary must distill the two analyses above, without repeating them, into:
+
+### Key Market Opportunity
+### Competitive Position
+### Strategic Recommendations
+
+Keep each analysis under 1000 words and the executive summary under 500. Focus on actionable, strategic insights."""
+    # Byte-identical across runs so the provider can serve it from its prompt cache
+    ANALYSIS_SYSTEM_PROMPT = f"{RESEARCH_CONTEXT_PREFIX}\n\n{ANALYSIS_SECTIONS_INSTRUCTIONS}"
+    
+    # Sections every analysis completion must return
+    ANALYSIS_KEYS = ("market_analysis", "competitive_analysis", "executive_summary")
+    
+    # Rough size of a full analysis response, used to scale streamed progress
+    EXPECTED_ANALYSIS_CHARS = 15000
+    
+    # SerpAPI query templates, filled per brief with format_map
+    MARKET_QUERY_TEMPLATES = (
+        "{search_terms} market size TAM billion 2024 2025",
+        "{search_terms} industry analysis growth forecast",
+        "{search_terms} competitive landscape market share"
+    )
+    COMPETITIVE_QUERY_TEMPLATES = (
+        "{search_terms} competitors market share funding",
+        "{search_terms} competitive analysis industry leaders"
+    )
+    
+    # Collapses whitespace runs when normalizing briefs for memoization
+    WHITESPACE_RE = re.compile(r"\s+")
+    
+    # Periodic reports worth linking from an SEC citation
+    PERIODIC_FORMS = frozenset({"10-K", "10-Q"})
+    
+    # Briefs about early-stage private ventures, and industries with few listed comparables, skip SEC research
+    PRIVATE_BRIEF_RE = re.compile(r"\b(?:startups?|start-ups?|pre-seed|seed[- ](?:round|stage|funding)|bootstrapped)\b")
+    # Stored in _is_sec_relevant's normalized form: lowercase, "_" and "-" as spaces
+    SEC_SKIP_INDUSTRIES = frozenset({"nonprofit", "non profit", "government", "local services"})
+    
+    # Structured output schemas so extraction responses are valid JSON by construction
+    INDUSTRY_RESPONSE_FORMAT = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "industry_info",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "primary_industry": {"type": "string"},
+                    "industry_keywords": {"type": "array", "items": {"type": "string"}},
+                    "market_focus": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["primary_industry", "industry_keywords", "market_focus"],
+                "additionalProperties": False
+            }
+        }
+    }
+    COMPANIES_RESPONSE_FORMAT = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "public_companies",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "companies": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "company": {"type": "string"},
+                                "ticker": {"type": "string"}
+                            },
+                            "required": ["company", "ticker"],
+                            "additionalProperties": False
+                        }
+                    }
+                },
+                "required": ["companies"],
+                "additionalProperties": False
+            }
+        }
+    }
+    
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Bounded timeouts and SDK retries (with jittered backoff) so one stalled request can't
+        # hold the run for the SDK's 10-minute default; hand calls are short and get a tighter limit.
+        # The long analysis completion is streamed, so its timeout applies per chunk
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=60.0, max_retries=2)
+        self.hand_timeout = 20.0
+        
+        # Brain model writes the analysis; the cheaper hand model does classification/extraction.
+        # AGENT_HAND_BASE_URL can point the hand at a self-hosted OpenAI-compatible endpoint
+        self.brain_model = os.getenv("AGENT_BRAIN_MODEL", "gpt-4o")
+        self.hand_model = os.getenv("AGENT_HAND_MODEL", "gpt-4.1-nano")
+        hand_base_url = os.getenv("AGENT_HAND_BASE_URL")
+        self.hand_client = (
+            AsyncOpenAI(api_key=os.getenv("AGENT_HAND_API_KEY", os.getenv("OPENAI_API_KEY")), base_url=hand_base_url,
+                        timeout=60.0, max_retries=2)
+            if hand_base_url else self.client
+        )
         self.serpapi_key = os.getenv("SERPAPI_KEY")
-        self.results_queue = Queue()
         self.session = None
         
-        # Streamlined industry consultancy mapping (top 3 per industry)
-        self.industry_consultancies = {
-            "technology": ["Gartner", "Forrester", "IDC"],
-            "healthcare": ["IQVIA", "Frost & Sullivan", "McKinsey Health"],
-            "financial_services": ["Oliver Wyman", "McKinsey Financial", "PwC Financial"],
-            "retail": ["NRF", "Euromonitor", "McKinsey Retail"],
-            "manufacturing": ["Frost & Sullivan", "Strategy&", "McKinsey Operations"],
-            "energy": ["Wood Mackenzie", "S&P Global", "McKinsey Energy"],
-            "automotive": ["Strategy&", "McKinsey Automotive", "BCG"],
-            "real_estate": ["CBRE Research", "JLL Research", "PwC Real Estate"],
-            "telecommunications": ["Analysys Mason", "Frost & Sullivan", "McKinsey TMT"],
-            "cybersecurity": ["Gartner Security", "Forrester Security", "IDC Security"],
-            "artificial_intelligence": ["Gartner AI", "Forrester AI", "McKinsey AI"],
-            "fintech": ["CB Insights", "McKinsey Fintech", "BCG Fintech"],
-            "e_commerce": ["Forrester", "Gartner", "McKinsey Retail"]
+        # SEC EDGAR API base URL and request headers
+        self.sec_base_url = "https://data.sec.gov"
+        self.sec_headers = {
+            'User-Agent': 'MarketingAgent/1.0 (contact@yourcompany.com)',
+            'Accept-Encoding': 'gzip, deflate'
         }
+        self.ticker_cik_map = None
+        # Set when the ticker map download fails, so the rest of the run skips it instead of retrying
+        self.ticker_map_failed = False
+        self.ticker_map_lock = None
+        self.sec_semaphore = None
         
-        # Core consultancy sites
-        self.consultancy_sites = {
-            "McKinsey": "mckinsey.com",
-            "BCG": "bcg.com",
-            "Gartner": "gartner.com",
-            "Forrester": "forrester.com",
-            "IDC": "idc.com",
-            "Frost & Sullivan": "frost.com",
-            "CB Insights": "cbinsights.com",
-            "Strategy&": "strategyand.pwc.com",
-            "PwC": "pwc.com",
-            "Deloitte": "deloitte.com"
-        }
+        # SerpAPI endpoint and per-request timeout
+        self.serpapi_url = "https://serpapi.com/search"
+        self.serpapi_timeout = aiohttp.ClientTimeout(total=10)
+        self.serpapi_semaphore = None
+        # In-flight searches by (query, num), so concurrent briefs asking the same query share one request
+        self.serpapi_inflight = {}
         
-        # SEC EDGAR API base URL
-        self.sec_base_url = "https://data.sec.gov"
+        # Attempts per SerpAPI/SEC request before giving up on rate limits and transient failures
+        self.http_max_attempts = 4
+        
+        # Caps in-flight OpenAI requests; created on first use inside the running event loop
+        self.openai_semaphore = None
         
     async def create_session(self):
         """Create async session for concurrent API calls"""
         if not self.session:
             timeout = aiohttp.ClientTimeout(total=20)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            # One pooled connector so every SerpAPI/SEC request reuses keep-alive connections;
+            # the per-host cap keeps us within SEC's 10 requests/second guideline. Resolved hosts are
+            # cached for the whole run and idle connections are kept warm between research phases
+            connector = aiohttp.TCPConnector(limit=20, limit_per_host=10, ttl_dns_cache=300, keepalive_timeout=30)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            # Created with the session so they belong to the running event loop
+            self.serpapi_semaphore = asyncio.Semaphore(10)
+            self.serpapi_inflight = {}
+            self.sec_semaphore = asyncio.Semaphore(10)
+            self.ticker_map_lock = asyncio.Lock()
+            self.ticker_map_failed = False
         return self.session
     
     async def close_session(self):
@@ -68,134 +362,317 @@ class MarketingAgent:
         if self.session:
             await self.session.close()
             self.session = None
+        # Belongs to the loop that is ending; a later run creates its own
+        self.openai_semaphore = None
+        await self.flush_caches()
     
-    def call_openai_agent_optimized(self, prompt, temperature=0.2, model="gpt-4o-mini"):
-        """Optimized OpenAI call with faster model and reduced tokens"""
+    async def flush_caches(self):
+        """Write the module caches to disk, one write per changed cache, off the event loop"""
+        await asyncio.gather(*(
+            asyncio.to_thread(cache.flush) for cache in (llm_cache, serp_cache, sec_cache, ticker_cache)
+        ))
+    
+    def _llm_cache_key(self, prompt, temperature, model, system_prompt, max_tokens, response_format=None):
+        """Cache key for a completion, or None when it isn't deterministic enough to cache"""
+        if temperature > 0.2:
+            return None
+        return ResponseCache.make_key(model, temperature, max_tokens, response_format, system_prompt, prompt)
+    
+    def _build_messages(self, prompt, system_prompt=None):
+        """Build chat messages with an optional system prefix"""
+        messages = [{"role": "user", "content": prompt}]
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
+        return messages
+    
+    def _resolve_model(self, model, role):
+        """Pick the client and model for a call; an explicit model overrides the role default"""
+        if role == "hand":
+            return self.hand_client, model or self.hand_model
+        return self.client, model or self.brain_model
+    
+    def _get_openai_semaphore(self):
+        """OpenAI concurrency limiter for the running event loop"""
+        if self.openai_semaphore is None:
+            self.openai_semaphore = asyncio.Semaphore(8)
+        return self.openai_semaphore
+    
+    async def call_openai_agent_optimized(self, prompt, temperature=0.2, model=None, system_prompt=None,
+                                          max_tokens=1500, response_format=None, role="brain", on_delta=None,
+                                          validate=None):
+        """Optimized OpenAI call with faster model and reduced tokens; streams deltas to on_delta when given.
+        Content is only cached when validate (if given) accepts it"""
+        client, model = self._resolve_model(model, role)
+        cache_key = self._llm_cache_key(prompt, temperature, model, system_prompt, max_tokens, response_format)
+        if cache_key:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        request_args = {}
+        if response_format:
+            request_args["response_format"] = response_format
+        if role == "hand":
+            request_args["timeout"] = self.hand_timeout
+        
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=temperature,
-                max_tokens=1500,  # Reduced from 4000
-                stream=False
-            )
-            return response.choices[0].message.content
+            async with self._get_openai_semaphore():
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=self._build_messages(prompt, system_prompt),
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=on_delta is not None,
+                    **request_args
+                )
+                if on_delta is None:
+                    content = response.choices[0].message.content
+                else:
+                    # The slot is held until the stream is drained, since the request is in flight until then
+                    chunks = []
+                    async for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            chunks.append(chunk.choices[0].delta.content)
+                            on_delta(chunk.choices[0].delta.content)
+                    content = "".join(chunks)
+            if cache_key and (validate is None or validate(content)):
+                llm_cache.set(cache_key, content)
+            return content
         except Exception as e:
             return f"OpenAI API Error: {str(e)}"
     
-    def identify_industry_optimized(self, brief):
+    def _normalize_brief(self, brief):
+        """Case- and whitespace-insensitive form of a brief for memo keys"""
+        return self.WHITESPACE_RE.sub(" ", brief.strip().lower())
+    
+    async def identify_industry_optimized(self, brief):
         """Streamlined industry identification"""
-        industry_prompt = f"""
-        Identify the primary industry for: "{brief}"
+        # Memoized on the normalized brief, so briefs differing only in case or spacing share a result
+        memo_key = ResponseCache.make_key("industry", self._normalize_brief(brief))
+        cached = llm_cache.get(memo_key)
+        if cached is not None:
+            return cached
         
-        Return JSON format:
-        {{
-            "primary_industry": "industry_name",
-            "industry_keywords": ["key1", "key2", "key3"],
-            "market_focus": ["market size", "growth", "competitive landscape"]
-        }}
+        industry_prompt = f'Brief: "{brief}"'
         
-        Keep response concise and focused on top 3 keywords only.
-        """
+        try:
+            # Simple classification: hand model, deterministic output
+            response = await self.call_openai_agent_optimized(
+                industry_prompt, temperature=0, system_prompt=self.INDUSTRY_INSTRUCTIONS,
+                role="hand", response_format=self.INDUSTRY_RESPONSE_FORMAT
+            )
+            industry_data = self._parse_json_response(response, "object")
+            if isinstance(industry_data, dict):
+                llm_cache.set(memo_key, industry_data)
+                return industry_data
+        except Exception:
+            # Unparseable or failed responses use the default classification below
+            pass
         
+        # API errors come back as plain text and fall through to the default
+        return {
+            "primary_industry": "technology",
+            "industry_keywords": ["market", "analysis", "research"],
+            "market_focus": ["market size", "growth", "competitive landscape"]
+        }
+    
+    def _parse_json_response(self, response, kind="object"):
+        """Parse a JSON reply, falling back to the first embedded JSON value for models
+        that wrap it in prose"""
         try:
-            response = self.call_openai_agent_optimized(industry_prompt, temperature=0.1)
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return {
-                    "primary_industry": "technology",
-                    "industry_keywords": ["market", "analysis", "research"],
-                    "market_focus": ["market size", "growth", "competitive landscape"]
-                }
-        except Exception as e:
-            return {
-                "primary_industry": "technology",
-                "industry_keywords": ["market", "analysis", "research"],
-                "market_focus": ["market size", "growth", "competitive landscape"]
-            }
+            return json_loads(response)
+        except json.JSONDecodeError:
+            return self._extract_first_json(response, kind)
     
-    def get_top_consultancies(self, industry_data):
-        """Get top 5 consultancies for the industry"""
-        primary_industry = industry_data.get("primary_industry", "technology")
-        consultancies = set()
+    def _extract_first_json(self, text, kind="object"):
+        """Return the first valid JSON object (or array) in text, or None; a linear scan
+        with raw_decode instead of a backtracking regex"""
+        decoder = json.JSONDecoder()
+        opener = "{" if kind == "object" else "["
+        start = text.find(opener)
         
-        # Add industry-specific consultancies
-        if primary_industry in self.industry_consultancies:
-            consultancies.update(self.industry_consultancies[primary_industry])
+        while start != -1:
+            try:
+                value, _ = decoder.raw_decode(text, start)
+                return value
+            except json.JSONDecodeError:
+                start = text.find(opener, start + 1)
         
-        # Add top-tier general consultancies
-        consultancies.update(["McKinsey", "BCG", "Gartner"])
-        
-        return list(consultancies)[:5]  # Limit to top 5
+        return None
     
-    async def async_market_research(self, brief, industry_data, max_results=3):
-        """Async market research with reduced scope"""
+    async def async_serp_research(self, brief, industry_data):
+        """Run the market and competitive SerpAPI queries as one concurrent batch"""
         market_data = []
+        competitive_data = []
         
         try:
-            consultancies = self.get_top_consultancies(industry_data)
-            search_terms = ' '.join(industry_data.get('industry_keywords', []))
-            
-            session = await self.create_session()
-            
-            # Create 3 targeted queries instead of multiple per consultancy
-            queries = [
-                f"{search_terms} market size TAM billion 2024 2025",
-                f"{search_terms} industry analysis growth forecast",
-                f"{search_terms} competitive landscape market share"
-            ]
-            
-            # Run queries concurrently
-            tasks = []
-            for query in queries:
-                tasks.append(self.fetch_market_data(session, query))
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # Joined once for every query in the batch; without keywords, search on the industry itself
+            search_terms = (
+                ' '.join(industry_data.get('industry_keywords') or [])
+                or industry_data.get('primary_industry', 'technology').replace('_', ' ')
+            )
             
-            for result in results:
-                if isinstance(result, list):
-                    market_data.extend(result[:2])  # Top 2 per query
-                    
+            if self.serpapi_key:
+                session = await self.create_session()
+                
+                # (query, fetcher, destination) for every search, so both groups share one gather
+                query_context = {"search_terms": search_terms}
+                searches = [
+                    (template.format_map(query_context), self.fetch_market_data, market_data)
+                    for template in self.MARKET_QUERY_TEMPLATES
+                ] + [
+                    (template.format_map(query_context), self.fetch_competitive_data, competitive_data)
+                    for template in self.COMPETITIVE_QUERY_TEMPLATES
+                ]
+                
+                # Near-duplicate queries are dropped across both groups, not just within each
+                kept_queries = set(self._dedupe_queries([query for query, _, _ in searches]))
+                searches = [search for search in searches if search[0] in kept_queries]
+                
+                results = await asyncio.gather(
+                    *[fetch(session, query) for query, fetch, _ in searches],
+                    return_exceptions=True
+                )
+                
+                # Each result is kept with its rank inside its own query, for tie-breaking below
+                for (_, _, destination), result in zip(searches, results):
+                    if isinstance(result, list):
+                        destination.extend(enumerate(result))
+                
+                # Rank each group as a whole with the same 2-per-query budget. Higher scores win, and
+                # equal scores go to the better-ranked hit, so tied groups still take each query's top hits
+                for destination in (market_data, competitive_data):
+                    budget = 2 * sum(1 for _, _, group in searches if group is destination)
+                    destination[:] = self._rank_results(destination, budget)
+                        
         except Exception as e:
             market_data.append({"error": f"Market research failed: {str(e)}"})
             
-        return market_data
+        return market_data, competitive_data
+    
+    def _rank_results(self, ranked_results, k):
+        """Top k of (rank within its query, result) pairs by relevance, ties going to the better
+        query rank, keeping the best copy of each URL"""
+        def sort_key(entry):
+            position, result = entry
+            return (result.get('relevance_score', 0), -position)
+        
+        best_by_url = {}
+        for entry in ranked_results:
+            result = entry[1]
+            key = result.get('url') or result.get('error') or id(result)
+            if key not in best_by_url or sort_key(entry) > sort_key(best_by_url[key]):
+                best_by_url[key] = entry
+        
+        return [result for _, result in heapq.nlargest(k, best_by_url.values(), key=sort_key)]
+    
+    def _dedupe_queries(self, queries, threshold=0.9):
+        """Drop queries whose word set nearly matches (Jaccard >= threshold) an already kept query"""
+        kept = []
+        kept_words = []
+        
+        for query in queries:
+            words = set(query.lower().split())
+            if any(len(words & other) / len(words | other) >= threshold for other in kept_words if words | other):
+                continue
+            kept.append(query)
+            kept_words.append(words)
+        
+        return kept
+    
+    async def _serpapi_search(self, session, query, num=3):
+        """Run a SerpAPI Google search and return its organic results, joining an identical
+        search that is already in flight instead of sending a second one"""
+        key = (query, num)
+        task = self.serpapi_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._serpapi_request(session, query, num))
+            self.serpapi_inflight[key] = task
+            task.add_done_callback(lambda _: self.serpapi_inflight.pop(key, None))
+        # Shielded so one cancelled caller doesn't cancel the search for the others
+        return await asyncio.shield(task)
+    
+    async def _serpapi_request(self, session, query, num):
+        """Send one SerpAPI Google search, retrying rate limits and transient failures with backoff"""
+        params = {
+            "engine": "google",
+            "q": query,
+            "api_key": self.serpapi_key,
+            "num": num,  # Reduced from 6
+            "gl": "us",
+            "hl": "en",
+            # Only the fields we read, so ads/knowledge graph/related searches are never sent or parsed
+            "json_restrictor": "organic_results[].{title,link,snippet}"
+        }
+        
+        data = await self._get_json_with_retry(
+            session, self.serpapi_url, self.serpapi_semaphore, params=params, timeout=self.serpapi_timeout
+        )
+        if data is None:
+            return None
+        return data.get("organic_results", [])[:num]
+    
+    async def _get_json_with_retry(self, session, url, semaphore, params=None, headers=None, timeout=None):
+        """GET a JSON endpoint, retrying rate limits and transient failures with capped backoff;
+        returns None for other non-200 responses. The semaphore is held per attempt, not while
+        backing off, so a throttled request doesn't block the ones queued behind it"""
+        request_args = {}
+        if timeout:
+            request_args["timeout"] = timeout
+        
+        for attempt in range(self.http_max_attempts):
+            retry_after = None
+            try:
+                async with semaphore:
+                    async with session.get(url, params=params, headers=headers, **request_args) as response:
+                        if response.status == 200:
+                            return json_loads(await response.read())
+                        # Only rate limits and server errors are worth retrying
+                        if response.status != 429 and response.status < 500:
+                            return None
+                        retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.http_max_attempts - 1:
+                    raise
+            
+            if attempt < self.http_max_attempts - 1:
+                if retry_after and retry_after.isdigit():
+                    # Honoured, but capped so a long Retry-After can't stall the whole run
+                    delay = min(float(retry_after), 10)
+                else:
+                    delay = min(10, 2 ** attempt) + random.uniform(0, 1)
+                await asyncio.sleep(delay)
+        
+        return None
     
     async def fetch_market_data(self, session, query):
         """Fetch market data asynchronously"""
+        cache_key = ResponseCache.make_key(query, "Market Research")
+        cached = serp_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            url = "https://serpapi.com/search"
-            params = {
-                "engine": "google",
-                "q": query,
-                "api_key": self.serpapi_key,
-                "num": 3,  # Reduced from 6
-                "gl": "us",
-                "hl": "en"
-            }
-            
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = []
-                    
-                    for item in data.get("organic_results", []):
-                        snippet = item.get('snippet', '')
-                        title = item.get('title', 'Market Report')
-                        relevance_score = self._calculate_relevance_optimized(snippet, title)
-                        
-                        if relevance_score > 3:
-                            results.append({
-                                "source": "Market Research",
-                                "title": title,
-                                "url": item.get('link', ''),
-                                "snippet": snippet,
-                                "relevance_score": relevance_score
-                            })
+            organic_results = await self._serpapi_search(session, query)
+            if organic_results is not None:
+                results = []
+                
+                for item in organic_results:
+                    snippet = item.get('snippet', '')
+                    title = item.get('title', 'Market Report')
+                    relevance_score = self._calculate_relevance_optimized(snippet, title)
                     
-                    return results
+                    if relevance_score > 3:
+                        results.append({
+                            "source": "Market Research",
+                            "title": title,
+                            "url": item.get('link', ''),
+                            "snippet": snippet,
+                            "relevance_score": relevance_score
+                        })
+                
+                serp_cache.set(cache_key, results)
+                return results
                     
         except Exception as e:
             return [{"error": f"Market data fetch failed: {str(e)}"}]
@@ -204,121 +681,96 @@ class MarketingAgent:
     
     def _calculate_relevance_optimized(self, snippet, title=""):
         """Simplified relevance scoring"""
-        high_value_terms = ['billion', 'million', 'market size', 'TAM', 'growth rate', 'CAGR']
         text = (snippet + " " + title).lower()
         
-        score = 0
-        for term in high_value_terms:
-            if term in text:
-                score += 2
-        
-        # Bonus for recent content
-        if any(year in text for year in ['2024', '2025', '2023']):
-            score += 1
-            
-        return score
+        # Each distinct signal counts once: 2 per high-value term, 1 for recent content
+        signals = {self.RELEVANCE_TERMS[match] for match in self.RELEVANCE_TERMS_RE.findall(text)}
+        return sum(weight for _, weight in signals)
     
-    async def async_competitive_analysis(self, brief, industry_data):
-        """Streamlined competitive analysis"""
-        competitive_data = []
+    async def fetch_competitive_data(self, session, query):
+        """Fetch competitive data asynchronously"""
+        cache_key = ResponseCache.make_key(query, "Competitive Intelligence")
+        cached = serp_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            search_terms = ' '.join(industry_data.get('industry_keywords', []))
-            
-            if self.serpapi_key:
-                session = await self.create_session()
-                
-                # 2 focused competitive queries
-                queries = [
-                    f"{search_terms} competitors market share funding",
-                    f"{search_terms} competitive analysis industry leaders"
-                ]
+            organic_results = await self._serpapi_search(session, query)
+            if organic_results is not None:
+                results = []
                 
-                tasks = []
-                for query in queries:
-                    tasks.append(self.fetch_competitive_data(session, query))
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
+                for item in organic_results:
+                    results.append({
+                        "source": "Competitive Intelligence",
+                        "title": item.get('title', 'Competitive Analysis'),
+                        "url": item.get('link', ''),
+                        "snippet": item.get('snippet', ''),
+                        "relevance_score": 5  # Simplified scoring
+                    })
                 
-                for result in results:
-                    if isinstance(result, list):
-                        competitive_data.extend(result[:2])
-                        
-        except Exception as e:
-            competitive_data.append({"error": f"Competitive analysis failed: {str(e)}"})
-            
-        return competitive_data
-    
-    async def fetch_competitive_data(self, session, query):
-        """Fetch competitive data asynchronously"""
-        try:
-            url = "https://serpapi.com/search"
-            params = {
-                "engine": "google",
-                "q": query,
-                "api_key": self.serpapi_key,
-                "num": 3,
-                "gl": "us",
-                "hl": "en"
-            }
-            
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = []
-                    
-                    for item in data.get("organic_results", []):
-                        results.append({
-                            "source": "Competitive Intelligence",
-                            "title": item.get('title', 'Competitive Analysis'),
-                            "url": item.get('link', ''),
-                            "snippet": item.get('snippet', ''),
-                            "relevance_score": 5  # Simplified scoring
-                        })
-                    
-                    return results
+                serp_cache.set(cache_key, results)
+                return results
                     
         except Exception as e:
             return [{"error": f"Competitive data fetch failed: {str(e)}"}]
         
         return []
     
-    def get_top_public_companies_optimized(self, brief, industry_data):
+    async def get_top_public_companies_optimized(self, brief, industry_data):
         """Get top 3 public companies for SEC analysis"""
-        company_prompt = f"""
-        Identify the top 3 public companies most relevant to: "{brief}"
-        Industry: {industry_data.get('primary_industry', 'technology')}
-        
-        Return JSON array:
-        [
-            {{"company": "Company Name", "ticker": "TICKER"}},
-            {{"company": "Company Name", "ticker": "TICKER"}},
-            {{"company": "Company Name", "ticker": "TICKER"}}
-        ]
+        primary_industry = industry_data.get("primary_industry", "technology")
+        # Memoized like the industry lookup, so retried or reworded briefs skip the call
+        memo_key = ResponseCache.make_key("companies", self._normalize_brief(brief), primary_industry)
+        cached = llm_cache.get(memo_key)
+        if cached is not None:
+            return cached
         
-        Focus on largest, most established companies only.
-        """
+        company_prompt = f'Brief: "{brief}"\nIndustry: {primary_industry}'
         
         try:
-            response = self.call_openai_agent_optimized(company_prompt, temperature=0.1)
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
+            # Simple listing: hand model, deterministic output
+            response = await self.call_openai_agent_optimized(
+                company_prompt, temperature=0, system_prompt=self.COMPANIES_INSTRUCTIONS,
+                role="hand", response_format=self.COMPANIES_RESPONSE_FORMAT
+            )
+            companies = self._parse_json_response(response, "object")
+            if isinstance(companies, dict) and "companies" in companies:
+                companies = companies["companies"]
             else:
-                return []
+                # Models without structured outputs may answer with a bare array
+                companies = self._extract_first_json(response, "array") or []
         except Exception as e:
             return []
+        
+        # An empty list usually means an API error, which is worth retrying next run
+        if companies:
+            llm_cache.set(memo_key, companies)
+        return companies
+    
+    def _is_sec_relevant(self, brief, industry_data):
+        """Cheap pre-filter: False when public-company filings are unlikely to inform the brief"""
+        if self.PRIVATE_BRIEF_RE.search(brief.lower()):
+            return False
+        # primary_industry comes back in snake_case, e.g. "local_services"
+        primary_industry = industry_data.get("primary_industry", "").strip().lower().replace("_", " ").replace("-", " ")
+        return primary_industry not in self.SEC_SKIP_INDUSTRIES
     
     async def async_sec_analysis(self, brief, industry_data):
         """Streamlined SEC analysis"""
         sec_insights = []
         
         try:
-            companies = self.get_top_public_companies_optimized(brief, industry_data)
+            session = await self.create_session()
             
-            if companies:
-                session = await self.create_session()
-                
+            # Fetch the ticker map while the model picks companies; a failed download is
+            # remembered for the run, so fetch_sec_data doesn't retry it per company
+            companies, _ = await asyncio.gather(
+                self.get_top_public_companies_optimized(brief, industry_data),
+                self.get_ticker_cik_map(session),
+                return_exceptions=True
+            )
+            
+            if isinstance(companies, list) and companies:
                 # Limit to top 2 companies for faster processing
                 tasks = []
                 for company in companies[:2]:
@@ -335,163 +787,284 @@ class MarketingAgent:
             
         return sec_insights
     
+    async def get_ticker_cik_map(self, session):
+        """Download company_tickers.json once and index it by ticker"""
+        # The lock makes concurrent company lookups wait for a single download
+        async with self.ticker_map_lock:
+            if self.ticker_cik_map is None:
+                self.ticker_cik_map = ticker_cache.get("company_tickers")
+            
+            if self.ticker_cik_map is None and not self.ticker_map_failed:
+                tickers_url = f"{self.sec_base_url}/files/company_tickers.json"
+                try:
+                    tickers_data = await self._get_json_with_retry(
+                        session, tickers_url, self.sec_semaphore, headers=self.sec_headers
+                    )
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    tickers_data = None
+                
+                if tickers_data is None:
+                    # One full retry cycle per run is enough; later companies get an empty map
+                    self.ticker_map_failed = True
+                else:
+                    self.ticker_cik_map = {
+                        value.get('ticker'): str(value.get('cik_str')).zfill(10)
+                        for value in tickers_data.values()
+                    }
+                    ticker_cache.set("company_tickers", self.ticker_cik_map)
+        
+        return self.ticker_cik_map or {}
+    
     async def fetch_sec_data(self, session, company):
         """Fetch SEC data asynchronously"""
         try:
             ticker = company.get('ticker', '').upper()
             company_name = company.get('company', '')
             
-            # Get company tickers
-            tickers_url = f"{self.sec_base_url}/files/company_tickers.json"
-            headers = {
-                'User-Agent': 'MarketingAgent/1.0 (contact@yourcompany.com)',
-                'Accept-Encoding': 'gzip, deflate'
-            }
+            # Find CIK
+            ticker_cik_map = await self.get_ticker_cik_map(session)
+            cik = ticker_cik_map.get(ticker)
             
-            async with session.get(tickers_url, headers=headers) as response:
-                if response.status == 200:
-                    tickers_data = await response.json()
-                    cik = None
-                    
-                    # Find CIK
-                    for key, value in tickers_data.items():
-                        if value.get('ticker') == ticker:
-                            cik = str(value.get('cik_str')).zfill(10)
-                            break
-                    
-                    if cik:
-                        # Get recent filings
-                        submissions_url = f"{self.sec_base_url}/submissions/CIK{cik}.json"
-                        async with session.get(submissions_url, headers=headers) as sub_response:
-                            if sub_response.status == 200:
-                                filing_data = await sub_response.json()
-                                
-                                return {
-                                    "source": "SEC Analysis",
-                                    "company": company_name,
-                                    "ticker": ticker,
-                                    "industry": filing_data.get('sicDescription', 'Unknown'),
-                                    "business_description": filing_data.get('description', 'No description')[:300],
-                                    "relevance_score": 9
-                                }
+            if cik:
+                # Submissions change at most a few times a day, so only the fields we use are cached
+                cache_key = ResponseCache.make_key("submissions", cik)
+                filing_fields = sec_cache.get(cache_key)
+                
+                if filing_fields is None:
+                    # Get recent filings
+                    submissions_url = f"{self.sec_base_url}/submissions/CIK{cik}.json"
+                    filing_data = await self._get_json_with_retry(
+                        session, submissions_url, self.sec_semaphore, headers=self.sec_headers
+                    )
+                    if filing_data is not None:
+                        recent_filings = self._recent_periodic_filings(filing_data)
+                        filing_fields = {
+                            "industry": filing_data.get('sicDescription', 'Unknown'),
+                            "business_description": filing_data.get('description', 'No description')[:300],
+                            "recent_filings": recent_filings,
+                            "url": self._filing_url(cik, recent_filings)
+                        }
+                        sec_cache.set(cache_key, filing_fields)
+                
+                if filing_fields is not None:
+                    return {
+                        "source": "SEC Analysis",
+                        "company": company_name,
+                        "ticker": ticker,
+                        "industry": filing_fields["industry"],
+                        "business_description": filing_fields["business_description"],
+                        "recent_filings": filing_fields.get("recent_filings", {}),
+                        "url": filing_fields.get("url", ""),
+                        "relevance_score": 9
+                    }
                                 
         except Exception as e:
             return {"error": f"SEC fetch failed for {company.get('ticker', 'Unknown')}: {str(e)}"}
         
         return {"error": "No data found"}
     
-    def generate_streaming_analysis(self, brief, research_data, progress_callback=None):
+    def _recent_periodic_filings(self, filing_data, limit=4):
+        """Latest 10-K/10-Q filings as parallel columns, mirroring SEC's own 'recent' layout"""
+        recent = filing_data.get('filings', {}).get('recent', {})
+        
+        # Scan only the form column and stop at the limit; rows are never built as dicts
+        indices = list(islice(
+            (i for i, form in enumerate(recent.get('form', [])) if form in self.PERIODIC_FORMS), limit
+        ))
+        
+        columns = {"form": "form", "date": "filingDate", "accession": "accessionNumber", "document": "primaryDocument"}
+        return {
+            column: [recent[key][i] for i in indices] if key in recent else []
+            for column, key in columns.items()
+        }
+    
+    def _filing_url(self, cik, recent_filings):
+        """EDGAR archive URL of the most recent periodic filing, if any"""
+        if not recent_filings.get("accession") or not recent_filings.get("document"):
+            return ""
+        accession = recent_filings["accession"][0].replace("-", "")
+        return f"https://www.sec.gov/Archives/edgar/data/{int(cik)}/{accession}/{recent_filings['document'][0]}"
+    
+    def _compact_research(self, research_data):
+        """Project research data down to the fields the analysis prompts need"""
+        compact = {}
+        
+        for category, sources in research_data.items():
+            # analysis_date changes every run and would make the prompt prefix unique
+            if category == "analysis_date":
+                continue
+            if not isinstance(sources, list):
+                compact[category] = sources
+                continue
+            
+            items = []
+            seen_titles = set()
+            for source in sources:
+                if not isinstance(source, dict) or "error" in source:
+                    continue
+                
+                title = source.get('title', source.get('company', ''))
+                if title in seen_titles:
+                    continue
+                seen_titles.add(title)
+                
+                item = {"source": source.get('source', ''), "title": title}
+                if source.get('industry'):
+                    item["industry"] = source['industry']
+                snippet = source.get('snippet') or source.get('business_description', '')
+                if snippet:
+                    item["snippet"] = snippet[:120]
+                items.append(item)
+            
+            compact[category] = items
+        
+        return compact
+    
+    def build_research_context(self, research_data):
+        """Serialize research data for the analysis prompt"""
+        research_json = json.dumps(self._compact_research(research_data), separators=(",", ":"), sort_keys=True)
+        return f"RESEARCH DATA:\n{research_json}"
+    
+    async def generate_streaming_analysis(self, brief, research_data, progress_callback=None):
         """Generate analysis with streaming updates"""
         
-        # Step 1: Market analysis
+        research_context = self.build_research_context(research_data)
+        
+        # All three sections come from one structured completion
         if progress_callback:
-            progress_callback("Analyzing market data...", 0.4)
+            progress_callback("Analyzing market data and competitive intelligence...", 0.4)
             
-        market_analysis = self.generate_market_analysis_optimized(brief, research_data)
-        
-        # Step 2: Competitive intelligence
+        on_delta = None
         if progress_callback:
-            progress_callback("Processing competitive intelligence...", 0.7)
+            # Advance the bar from 0.4 towards 0.9 as tokens arrive, every ~20 deltas
+            received = {"deltas": 0, "chars": 0}
             
-        competitive_analysis = self.generate_competitive_analysis_optimized(brief, research_data)
+            def on_delta(delta):
+                received["deltas"] += 1
+                received["chars"] += len(delta)
+                if received["deltas"] % 20 == 0:
+                    done = min(received["chars"] / self.EXPECTED_ANALYSIS_CHARS, 1.0)
+                    progress_callback("Writing analysis...", 0.4 + 0.5 * done)
+        
+        sections = await self.generate_full_analysis_optimized(brief, research_context, on_delta)
         
-        # Step 3: Executive summary
         if progress_callback:
-            progress_callback("Generating executive summary...", 0.9)
-            
-        executive_summary = self.generate_executive_summary_optimized(brief, market_analysis, competitive_analysis)
+            progress_callback("Assembling executive summary...", 0.9)
+        
+        # The summary report is assembled locally instead of re-sending both analyses to the model;
+        # a failed completion has no detail sections and is shown once as the summary
+        executive_summary = f"## EXECUTIVE SUMMARY\n\n{sections['executive_summary']}"
+        if sections["market_analysis"] or sections["competitive_analysis"]:
+            executive_summary += (
+                f"\n\n## DETAILED ANALYSIS\n\n"
+                f"### Market Analysis\n{sections['market_analysis']}\n\n"
+                f"### Competitive Analysis\n{sections['competitive_analysis']}"
+            )
         
         return {
-            "market_analysis": market_analysis,
-            "competitive_analysis": competitive_analysis,
+            "market_analysis": sections["market_analysis"],
+            "competitive_analysis": sections["competitive_analysis"],
             "executive_summary": executive_summary
         }
     
-    def generate_market_analysis_optimized(self, brief, research_data):
-        """Optimized market analysis generation"""
-        market_prompt = f"""
-        Based on: "{brief}"
+    async def generate_full_analysis_optimized(self, brief, research_context, on_delta=None):
+        """Generate market analysis, competitive analysis and executive summary in one JSON completion"""
+        # Invariant instructions in the system message; per-run research data and the brief after them
+        analysis_prompt = f'{research_context}\n\nBrief: "{brief}"'
+        # Always streamed: the client's 60s timeout then bounds the gap between chunks rather than
+        # the whole multi-thousand-token completion
+        if on_delta is None:
+            on_delta = lambda delta: None
         
-        Create focused market analysis:
+        response = await self.call_openai_agent_optimized(
+            analysis_prompt,
+            temperature=0.1,
+            system_prompt=self.ANALYSIS_SYSTEM_PROMPT,
+            max_tokens=4500,
+            response_format={"type": "json_object"},
+            on_delta=on_delta,
+            # Truncated or malformed JSON must not be replayed from the cache on the next run
+            validate=lambda content: self._parse_analysis_sections(content) is not None
+        )
         
-        ## MARKET OPPORTUNITY
-        - Market Size (TAM/SAM/SOM estimates)
-        - Growth Rate & Trends
-        - Key Market Drivers
-        
-        ## TARGET MARKET
-        - Primary Customer Segments
-        - Market Entry Strategy
-        - Revenue Potential
-        
-        Keep response under 1000 words. Focus on actionable insights.
-        """
-        
-        return self.call_openai_agent_optimized(market_prompt, temperature=0.1)
+        sections = self._parse_analysis_sections(response)
+        if sections is None:
+            # API errors and truncated output are surfaced once, as the summary
+            return {"market_analysis": "", "competitive_analysis": "", "executive_summary": response}
+        return sections
     
-    def generate_competitive_analysis_optimized(self, brief, research_data):
-        """Optimized competitive analysis"""
-        competitive_prompt = f"""
-        Create competitive analysis for: "{brief}"
-        
-        ## COMPETITIVE LANDSCAPE
-        - Top 3 Direct Competitors
-        - Competitive Advantages/Disadvantages
-        - Market Positioning
-        
-        ## STRATEGIC RECOMMENDATIONS
-        - Differentiation Strategy
-        - Competitive Response
-        - Market Entry Tactics
-        
-        Keep response under 1000 words. Focus on strategic insights.
-        """
-        
-        return self.call_openai_agent_optimized(competitive_prompt, temperature=0.1)
+    def _parse_analysis_sections(self, response):
+        """Parse the analysis JSON, or None when it is malformed, truncated or missing a section"""
+        try:
+            sections = json_loads(response)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(sections, dict) or not all(isinstance(sections.get(key), str) for key in self.ANALYSIS_KEYS):
+            return None
+        return {key: sections[key] for key in self.ANALYSIS_KEYS}
     
-    def generate_executive_summary_optimized(self, brief, market_analysis, competitive_analysis):
-        """Optimized executive summary"""
-        summary_prompt = f"""
-        Create executive summary for: "{brief}"
-        
-        ## EXECUTIVE SUMMARY
-        ### Key Market Opportunity
-        ### Competitive Position
-        ### Strategic Recommendations
+    def build_citations(self, research_data):
+        """Build the key sources section from research data"""
+        parts = ["\n\n## KEY SOURCES\n\n"]
+        source_count = 0
         
-        ## DETAILED ANALYSIS
+        for source_type, sources in research_data.items():
+            if source_type not in ["analysis_date", "industry_data"] and sources:
+                parts.append(f"### {source_type.replace('_', ' ').title()}:\n")
+                # Limit to the top 2 by relevance, filtering and ranking in one pass
+                valid_sources = (source for source in sources if isinstance(source, dict) and "error" not in source)
+                for source in heapq.nlargest(2, valid_sources, key=lambda x: x.get('relevance_score', 0)):
+                    parts.append(f"- {source.get('title', source.get('company', 'Source'))}\n")
+                    if source.get('url'):
+                        parts.append(f"  📎 {source['url']}\n")
+                    source_count += 1
         
-        ### Market Analysis
-        {market_analysis}
+        parts.append(f"\n**Total Sources Analyzed:** {source_count}\n")
+        # Same timestamp the research was stamped with, rather than a second clock read
+        analysis_date = research_data.get("analysis_date")
+        analysis_time = datetime.fromisoformat(analysis_date) if analysis_date else datetime.now()
+        parts.append(f"**Analysis Date:** {analysis_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
         
-        ### Competitive Analysis
-        {competitive_analysis}
+        return "".join(parts)
+    
+    def _quantized_progress(self, progress_callback, step=0.01):
+        """Wrap a progress callback so repeated messages only fire when progress advances by at least step"""
+        if progress_callback is None:
+            return None
+        last = {"progress": -1.0, "message": None}
         
-        Keep total response under 1500 words. Focus on actionable insights.
-        """
+        def report(message, progress):
+            # A new stage always goes through, even if it reports the same progress as the last one
+            if message != last["message"] or progress - last["progress"] >= step or progress >= 1.0:
+                last["progress"] = progress
+                last["message"] = message
+                progress_callback(message, progress)
         
-        return self.call_openai_agent_optimized(summary_prompt, temperature=0.1)
+        return report
     
-    async def marketing_agent_optimized(self, brief, progress_callback=None):
+    async def marketing_agent_optimized(self, brief, progress_callback=None, close_session=True):
         """Optimized main marketing analysis function"""
+        # Streamed analysis reports often; the UI only needs to hear about visible movement
+        progress_callback = self._quantized_progress(progress_callback)
         
         if progress_callback:
             progress_callback("Starting market research...", 0.1)
         
         # Step 1: Industry identification
-        industry_data = self.identify_industry_optimized(brief)
+        industry_data = await self.identify_industry_optimized(brief)
         
         if progress_callback:
             progress_callback("Gathering market intelligence...", 0.2)
         
-        # Step 2: Run research concurrently
-        research_tasks = [
-            self.async_market_research(brief, industry_data),
-            self.async_competitive_analysis(brief, industry_data),
-            self.async_sec_analysis(brief, industry_data)
-        ]
-        
-        market_research, competitive_intel, sec_analysis = await asyncio.gather(*research_tasks)
+        # Step 2: Run research concurrently; the SEC branch only when public filings can help
+        if self._is_sec_relevant(brief, industry_data):
+            (market_research, competitive_intel), sec_analysis = await asyncio.gather(
+                self.async_serp_research(brief, industry_data),
+                self.async_sec_analysis(brief, industry_data)
+            )
+        else:
+            market_research, competitive_intel = await self.async_serp_research(brief, industry_data)
+            sec_analysis = []
         
         # Compile research data
         research_data = {
@@ -506,30 +1079,20 @@ class MarketingAgent:
             progress_callback("Analyzing research data...", 0.3)
         
         # Generate analysis with streaming updates
-        analysis_results = self.generate_streaming_analysis(brief, research_data, progress_callback)
+        analysis_task = asyncio.create_task(self.generate_streaming_analysis(brief, research_data, progress_callback))
         
-        # Compile final results
-        final_analysis = analysis_results["executive_summary"]
+        # Let the analysis request go out, then build citations while it is in flight
+        await asyncio.sleep(0)
+        citations = self.build_citations(research_data)
         
-        # Add simplified citations
-        citations = "\n\n## KEY SOURCES\n\n"
-        source_count = 0
+        analysis_results = await analysis_task
         
-        for source_type, sources in research_data.items():
-            if source_type not in ["analysis_date", "industry_data"] and sources:
-                citations += f"### {source_type.replace('_', ' ').title()}:\n"
-                for source in sources[:2]:  # Limit to top 2
-                    if isinstance(source, dict) and "error" not in source:
-                        citations += f"- {source.get('title', source.get('company', 'Source'))}\n"
-                        if source.get('url'):
-                            citations += f"  📎 {source['url']}\n"
-                        source_count += 1
-        
-        citations += f"\n**Total Sources Analyzed:** {source_count}\n"
-        citations += f"**Analysis Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        # Compile final results
+        final_analysis = analysis_results["executive_summary"]
         
-        # Close session
-        await self.close_session()
+        # Close session, unless a pool is sharing it across briefs
+        if close_session:
+            await self.close_session()
         
         if progress_callback:
             progress_callback("Analysis complete!", 1.0)
@@ -544,64 +1107,42 @@ def run_optimized_marketing_analysis(brief, progress_callback=None):
 
 def marketing_agent(brief):
     return run_optimized_marketing_analysis(brief)
-     
-# def marketing_agent(brief: str):
-#     agent = MarketingAgent()
-#     report_dict = agent.generate_comprehensive_report(brief)
-#     if brief.find("- Output Format: Detailed Report") != -1:
-#         formatted_report = f"""{report_dict.get('comprehensive_analysis', 'Comprehensive analysis not available')}"""
-#     else:
-#         formatted_report = f"""{report_dict.get('executive_summary', 'Executive summary not available')}"""
-#     formatted_report += f"""
-
-#         **Analysis Date:** {report_dict.get('research_metadata', {}).get('analysis_date', 'Not available')}
-
-#         **Industry Classification:** {report_dict.get('research_metadata', {}).get('industry_classification', {}).get('primary_industry', 'Not specified')}
-
-#         **Total Sources Analyzed:** {report_dict.get('research_metadata', {}).get('total_sources', 0)}
-
-#         ### Data Sources Breakdown:
-#         """
-    
-#     # Add data sources breakdown
-#     data_sources = report_dict.get('research_metadata', {}).get('data_sources_analyzed', {})
-#     for source_type, count in data_sources.items():
-#         formatted_report += f"- **{source_type.replace('_', ' ').title()}:** {count} sources\n"
-    
-#     # Add data source summary if available
-#     data_source_summary = report_dict.get('data_source_summary', {})
-#     if data_source_summary:
-#         formatted_report += f"\n### 🔍 DATA SOURCE QUALITY ASSESSMENT\n"
-        
-#         high_cred_sources = len(data_source_summary.get('high_credibility_sources', []))
-#         sec_sources = len(data_source_summary.get('sec_filing_sources', []))
-#         quant_sources = len(data_source_summary.get('quantitative_data_sources', []))
-#         recent_sources = len(data_source_summary.get('recent_sources', []))
-        
-#         formatted_report += f"- **High Credibility Sources:** {high_cred_sources}\n"
-#         formatted_report += f"- **SEC Filing Sources:** {sec_sources}\n"
-#         formatted_report += f"- **Quantitative Data Sources:** {quant_sources}\n"
-#         formatted_report += f"- **Recent Sources (2024-2025):** {recent_sources}\n"
-    
-#     formatted_report += f"""
-
-#             This comprehensive analysis leverages {report_dict.get('research_metadata', {}).get('total_sources', 0)} data sources including:
-#             - Industry-specific consultancy reports
-#             - SEC filing analysis from relevant public companies
-#             - Competitive intelligence and market research
-#             - Macro trend analysis and regulatory insights
-#             - Investment and funding landscape analysis
-
-#             **Recommended Next Steps:**
-#             1. Review the executive summary for immediate strategic priorities
-#             2. Analyze the competitive positioning recommendations
-#             3. Evaluate the market sizing and revenue opportunity
-#             4. Consider the regulatory and compliance requirements
-#             5. Develop implementation roadmap based on strategic recommendations
-
-#             ---
-
-#             *This report was generated using advanced AI-powered market research and analysis. The insights are based on publicly available data and should be validated with additional primary research as needed.*
-#             """
-#     return formatted_report
 
+class MarketingAgentPool:
+    """Runs batches of briefs on one long-lived event loop so the session, semaphores and ticker map are reused"""
+    
+    def __init__(self):
+        self.agent = MarketingAgent()
+        self.runner = asyncio.Runner()
+    
+    async def _analyze_all(self, briefs):
+        # The session outlives a batch, so give each batch its own ticker-map download attempt
+        self.agent.ticker_map_failed = False
+        results = await asyncio.gather(*(
+            self.agent.marketing_agent_optimized(brief, close_session=False) for brief in briefs
+        ))
+        # The session stays open between batches, so persist this batch's cache entries now
+        await self.agent.flush_caches()
+        return results
+    
+    async def _close(self):
+        await self.agent.close_session()
+        # The OpenAI clients' connection pools belong to the runner's loop too
+        await self.agent.client.close()
+        if self.agent.hand_client is not self.agent.client:
+            await self.agent.hand_client.close()
+    
+    def analyze_many(self, briefs):
+        """Analyze briefs concurrently, returning results in brief order"""
+        return self.runner.run(self._analyze_all(briefs))
+    
+    def close(self):
+        """Close the shared session, the OpenAI clients and the event loop"""
+        self.runner.run(self._close())
+        self.runner.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()